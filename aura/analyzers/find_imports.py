@@ -1,8 +1,8 @@
+import ast
 from collections import defaultdict
 from pathlib import Path
 from typing import List, Tuple, Optional
 
-from . import find_imports_inject
 from .. import python_executor
 from .. import utils
 
@@ -43,12 +43,46 @@ class TopologySort:
         return topology
 
 
+# Fields holding the nested statement lists, expressions are never traversed as they can be nested very deeply
+STMT_LIST_FIELDS = ("body", "handlers", "orelse", "finalbody", "cases")
+# Function and class bodies are compiled into separate code objects
+SKIPPED_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def collect_imports(tree: ast.Module) -> List[list]:
+    """
+    In-process counterpart of the injected `find_imports_inject.find_imports`
+    Imports are collected from the AST, which avoids compiling the source code into the bytecode
+    Only imports within the module code object are collected, same as by the bytecode scan
+    """
+    imports = []
+    stack = [iter(tree.body)]
+
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.append([0, None, alias.name])
+        elif isinstance(node, ast.ImportFrom):
+            imports.append([node.level, [alias.name for alias in node.names], node.module or ""])
+        elif not isinstance(node, SKIPPED_SCOPES):
+            # Reversed so the nested statements are visited in the source code order
+            for field in reversed(STMT_LIST_FIELDS):
+                stmts = getattr(node, field, None)
+                if stmts:
+                    stack.append(iter(stmts))
+
+    return imports
+
+
 def native_find_imports(command):
     src_path = command[-1]
-    with open(src_path, "r") as fd:
-        co = compile(fd.read() + "\n", src_path, "exec")
+    with open(src_path, "rb") as fd:
+        tree = ast.parse(fd.read() + b"\n", src_path)
 
-    return list(find_imports_inject.find_imports(co))
+    return collect_imports(tree)
 
 
 def get_imports(py_src, metadata=None) -> List:
@@ -12,8 +12,6 @@ from pathlib import Path
 from warnings import warn
 from typing import Optional, Tuple, Union
 
-import pkg_resources
-
 from .nodes import Context, ASTNode
 from ..detections import Detection
 from ...stack import CallGraph
@@ -143,7 +141,7 @@ class Visitor:
         if VISITORS is None:
             VISITORS = {
                 x.name: x.load()
-                for x in pkg_resources.iter_entry_points("aura.ast_visitors")
+                for x in config.iter_entry_points("aura.ast_visitors")
             }
 
         return VISITORS
@@ -1,3 +1,4 @@
+from .. import config
 from ..uri_handlers.base import ScanLocation
 
 from .detections import Detection
@@ -16,9 +17,10 @@ def analyze(*, location: ScanLocation):
         "size": location.size,
     }
 
-    for x in ("tlsh", "md5", "sha1", "sha256", "sha512"):
-        if x in location.metadata:
-            info[x] = location.metadata[x]
+    # Only the digests configured via `aura.hashes` are reported, these are already computed for every file
+    for x, digest in location.get_digests(config.get_file_hashes()).items():
+        if digest is not None:
+            info[x] = digest
 
     yield Detection(
         detection_type="FileStats",
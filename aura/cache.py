@@ -1,8 +1,9 @@
 import os
+import json
 import shutil
 import hashlib
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Callable, List
 
 from . import utils
 from . import config
@@ -108,3 +109,40 @@ class Cache:
         except Exception as exc:
             cache_path.unlink(missing_ok=True)
             raise exc
+
+    @classmethod
+    def proxy_typos(cls, *, name: str, cache_key: list, compute: Callable[[], List[str]]) -> List[str]:
+        """
+        Retrieve typosquatting candidates for the package `name` from cache, calling `compute` on a cache miss
+        Cached entry is recomputed and overwritten if it was created with a different `cache_key`
+        """
+        if cls.get_location() is None:
+            return compute()
+
+        # Package name is not guaranteed to be a safe file name
+        cache_id = f"typos_{hashlib.md5(name.encode()).hexdigest()}"
+        cache_path = cls.get_location() / cache_id
+
+        try:
+            with cache_path.open("r") as fd:
+                cached = json.load(fd)
+            if cached["name"] == name and cached["key"] == cache_key:
+                logger.debug(f"Retrieving typosquatting candidates {cache_id} from cache")
+                return cached["typos"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        result = compute()
+
+        # Failure to write the cache entry does not affect the result
+        try:
+            with cache_path.open("w") as fd:
+                json.dump({"name": name, "key": cache_key, "typos": result}, fd)
+        except (OSError, TypeError, ValueError) as exc:
+            logger.warning(f"Could not write typosquatting candidates of `{name}` into the cache: {exc}")
+            try:
+                cache_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+        return result
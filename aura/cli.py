@@ -223,12 +223,13 @@ def update_aura():
 @click.option("-o", "--out", default="-", type=click.File("w"))
 @click.option("-m", "--max-distance", default=2, type=click.IntRange(min=0, max=10))
 @click.option("-l", "--limit", default=None, type=click.INT)
-def find_typosquatting(out, max_distance, limit=None):
-    if limit <= 0:
+@click.option("-k", "--topk", default=None, type=click.IntRange(min=1), help="Output at most N closest typosquattings for each popular package, ranked by distance up to --max-distance (by default only distance 1 is reported)")
+def find_typosquatting(out, max_distance, limit=None, topk=None):
+    if limit is not None and limit <= 0:
         click.secho("Invalid value for limit", file=sys.stderr)
         sys.exit(1)
 
-    commands.generate_typosquatting(out=out, distance=max_distance, limit=limit)
+    commands.generate_typosquatting(out=out, distance=max_distance, limit=limit, topk=topk)
 
 
 @cli.group("r2c")
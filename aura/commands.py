@@ -2,15 +2,16 @@ from __future__ import annotations
 
 import sys
 import os
-import json
 import time
 import traceback
 from pathlib import Path
+from collections import deque
 from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Union, Optional, Tuple, Generator, List
 
 import click
-from prettyprinter import pprint
 
 from .package_analyzer import Analyzer
 from .uri_handlers.base import URIHandler, ScanLocation
@@ -18,9 +19,7 @@ from .uri_handlers.base import URIHandler, ScanLocation
 from . import config
 from . import exceptions
 from . import utils
-from . import mirror
-from . import typos
-from .package import PypiPackage
+from .json_proxy import dumps, loads
 from .analyzers.detections import Detection
 from .output.base import ScanOutputBase, DiffOutputBase, InfoOutputBase
 
@@ -29,6 +28,8 @@ logger = config.get_logger(__name__)
 
 
 def check_requirement(pkg):
+    from . import typos
+
     click.secho("Received payload from package manager, running security audit...")
 
     out_format = ScanOutputBase.from_uri("text")
@@ -64,25 +65,47 @@ def check_requirement(pkg):
     sys.exit(1)
 
 
+def bounded_map(executor, fn, iterable, max_pending: int) -> Generator:
+    """
+    Same as `executor.map` but the iterable is consumed lazily, at most `max_pending` jobs are submitted at once
+    Results are yielded in the order of the input iterable, jobs not yet started are cancelled if the generator is closed
+    """
+    pending = deque()
+
+    try:
+        for item in iterable:
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(executor.submit(fn, item))
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for job in pending:
+            job.cancel()
+
+
 def scan_worker(item: ScanLocation) -> Generator[Detection, None, None]:
     if not item.location.exists():
         logger.error(f"Location '{item.str_location}' does not exists. Skipping")
-        yield []
+        return
     else:
         sandbox = Analyzer(location=item)
         yield from sandbox.run()
 
 
 def scan_uri(uri, metadata: Union[list, dict]=None, download_only: bool=False) -> List[Detection]:
+    """
+    Scan the given URI and stream the produced hits into the configured output formats
+
+    :return: list of hits if no output format is configured, otherwise an empty list as the hits are consumed by the outputs
+    """
     with utils.enrich_exception(uri, metadata):
         start = time.time()
         handler = None
         metadata = metadata or {}
-        output_format = metadata.get("format", "text")
-        all_hits = []
-
-        if type(output_format) not in (list, tuple):
-            output_format = (output_format,)
+        output_format = utils.as_tuple(metadata.get("format", "text"))
+        collected_hits = []
 
         formatters = [ScanOutputBase.from_uri(x, opts=metadata.get("output_opts")) for x in output_format]
 
@@ -102,20 +125,51 @@ def scan_uri(uri, metadata: Union[list, dict]=None, download_only: bool=False) -
             })
 
             # FIXME: metadata=metadata
-            for x in handler.get_paths(metadata={"analyzers": metadata["analyzers"]}):  # type: ScanLocation
-                if download_only:
-                    continue
-                else:
-                    all_hits.extend(scan_worker(x))
+            locations = handler.get_paths(metadata={"analyzers": metadata.get("analyzers")})
 
-            for formatter in formatters:
-                try:
-                    filtered_hits = formatter.filtered(all_hits)
-                except exceptions.MinimumScoreNotReached:
+            if download_only:
+                for _ in locations:
                     pass
-                else:
-                    with formatter:
-                        formatter.output(hits=filtered_hits, scan_metadata=metadata)
+                locations = ()
+
+            def scan_location(loc: ScanLocation) -> Generator[Detection, None, None]:
+                try:
+                    yield from scan_worker(loc)
+                finally:
+                    # Free the data of the location right away instead of waiting for the whole scan to finish
+                    handler.drop_location(loc)
+
+            parallel = metadata.get("parallel")
+            if parallel is None:
+                # Opt-in as every location is analyzed by its own executor and downloads/extracts its own archives
+                parallel = bool(config.CFG["aura"].get("parallel-locations", False)) and not metadata.get("fork")
+
+            if not locations:
+                executor = None
+                results = ()
+            elif parallel:
+                max_workers = os.cpu_count() or 1
+                executor = ThreadPoolExecutor(max_workers=max_workers)
+                # Locations are consumed lazily so only the locations being scanned are downloaded/extracted at once
+                results = bounded_map(executor, lambda loc: list(scan_location(loc)), locations, max_pending=max_workers)
+            else:
+                executor = None
+                results = map(scan_location, locations)
+
+            try:
+                for hits in results:
+                    for hit in hits:
+                        if not formatters:
+                            collected_hits.append(hit)
+
+                        for formatter in formatters:
+                            formatter.feed(hit)
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+
+            for formatter in formatters:
+                formatter.flush(scan_metadata=metadata)
 
         except exceptions.NoSuchPackage:
             logger.warn(f"No such package: {uri}")
@@ -127,7 +181,7 @@ def scan_uri(uri, metadata: Union[list, dict]=None, download_only: bool=False) -
                 handler.cleanup()
 
         logger.info(f"Scan finished in {time.time() - start} s")
-        return all_hits
+        return collected_hits
 
 
 def data_diff(a_path: str, b_path: str, format_uri=("text",), output_opts=None):
@@ -141,9 +195,7 @@ def data_diff(a_path: str, b_path: str, format_uri=("text",), output_opts=None):
         output_opts = {}
 
     uri_handler1, uri_handler2 = URIHandler.diff_from_uri(a_path, b_path)
-
-    if type(format_uri) not in (tuple, list):
-        format_uri = (format_uri,)
+    format_uri = utils.as_tuple(format_uri)
 
     formatters = [DiffOutputBase.from_uri(x, opts=output_opts) for x in format_uri]
 
@@ -160,32 +212,59 @@ def data_diff(a_path: str, b_path: str, format_uri=("text",), output_opts=None):
             formatter.output_diff(analyzer)
 
 
+def _init_scan_worker():
+    """
+    Initializer for the scan worker processes
+    Preload the URI handlers and analyzers once per worker instead of lazily during the first scan
+    """
+    from . import plugins
+
+    URIHandler.load_handlers()
+    plugins.get_analyzers()
+
+
+def _scan_one_mirror_pkg(pkg: str, output_dir: Path):
+    uri = f"mirror://{pkg}"
+    out_pth = output_dir / f"{pkg}.scan_results.json"
+
+    metadata = {
+        "format": f"json://{os.fspath(out_pth.absolute())}",
+        "fork": True,
+        "parallel": False  # Packages are already scanned in parallel by the mirror workers
+    }
+    scan_uri(uri=uri, metadata=metadata)
+
+
 def scan_mirror(output_dir: Path):
+    from . import mirror
+
     mirror_pth = mirror.LocalMirror.get_mirror_path()
-    click.echo("Collecting package names from a mirror")
-    pkgs = list(x.name for x in Path(mirror_pth / "json").iterdir())
-    click.echo(f"Collected {len(pkgs)} packages")
+    json_pth = mirror_pth / "json"
+    click.echo("Counting packages in a mirror")
+    # Package names are iterated lazily in a second pass instead of keeping the full list in memory
+    with os.scandir(json_pth) as entries:
+        total = sum(1 for _ in entries)
+    click.echo(f"Collected {total} packages")
     click.echo("Spawning scanning workers")
 
-    with click.progressbar(pkgs) as bar:
-        for idx, pkg in enumerate(bar):
-            uri = f"mirror://{pkg}"
-
-            out_pth = output_dir / f"{pkg}.scan_results.json"
+    worker = partial(_scan_one_mirror_pkg, output_dir=output_dir)
+    max_workers = os.cpu_count()
 
-            metadata = {
-                "format": "json",
-                "output_path": os.fspath(out_pth),
-                "fork": True
-            }
-            scan_uri(uri=uri, metadata=metadata)
-            # executor.apply_async(
-            #     func=scan_uri,
-            #     kwds={"uri": uri, "metadata": metadata}
-            # )
+    with click.progressbar(length=total) as bar, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=_init_scan_worker) as executor, \
+            os.scandir(json_pth) as entries:
+        # Bound the number of queued jobs so the futures are not created for the whole mirror at once
+        results = bounded_map(executor, worker, (entry.name for entry in entries), max_pending=max_workers * 2)
+        try:
+            for _ in results:
+                bar.update(1)
+        finally:
+            # Cancels the queued jobs, e.g. on KeyboardInterrupt
+            results.close()
 
 
 def parse_ast(path: Union[str, Path], stages: Optional[Tuple[str,...]]=None, format="text"):
+    from prettyprinter import pprint
     from .analyzers.python.visitor import Visitor
 
     if stages:
@@ -200,7 +279,7 @@ def parse_ast(path: Union[str, Path], stages: Optional[Tuple[str,...]]=None, for
     if format == "text":
         pprint(v.tree, indent=2)
     elif format == "json":
-        print(json.dumps(v.tree, default=utils.json_encoder))
+        print(dumps(v.tree))
 
 
 def show_info():
@@ -213,55 +292,124 @@ def show_info():
     formatter.output_info_data(info_data)
 
 
-def generate_typosquatting(out, distance=2, limit=None):
+def generate_typosquatting(out, distance=2, limit=None, topk=None, flush_every=8192):
+    from . import typos
+
     f = partial(typos.damerau_levenshtein, max_distance=distance)
     pth = config.get_pypi_stats_path()
-    for num, (x, y) in enumerate(typos.enumerator(typos.generate_popular(pth), f)):
+    pairs = typos.generate_popular(pth, max_distance=distance)
+    buffer = []
+
+    if topk:
+        typosquattings = typos.nearest(pairs, f, topk=topk)
+    else:
+        typosquattings = typos.enumerator(pairs, f)
+
+    for num, (x, y) in enumerate(typosquattings):
         if limit and num >= limit:
             break
 
-        out.write(json.dumps({"original": x, "typosquatting": y}) + "\n")
+        buffer.append(dumps({"original": x, "typosquatting": y}) + "\n")
 
+        if len(buffer) >= flush_every:
+            out.write("".join(buffer))
+            buffer.clear()
 
-def generate_r2c_input(out_file):
-    inputs = []
+    out.write("".join(buffer))
 
-    for pkg_name in PypiPackage.list_packages():
-        try:
-            pkg = PypiPackage.from_pypi(pkg_name)
-        except exceptions.NoSuchPackage:
-            continue
-        targets = []
 
-        input_definition = {
-            "metadata": {"package": pkg_name},
-            "input_type": "AuraInput",
-        }
+def _fetch_r2c_input(pkg_name: str) -> Optional[dict]:
+    from .package import PypiPackage
 
-        for url in pkg.info["urls"]:
-            targets.append({"url": url["url"], "metadata": url})
+    try:
+        pkg = PypiPackage.from_pypi(pkg_name)
+    except exceptions.NoSuchPackage:
+        return None
+
+    targets = [{"url": url["url"], "metadata": url} for url in pkg.info["urls"]]
+
+    return {
+        "metadata": {"package": pkg_name},
+        "input_type": "AuraInput",
+        "targets": dumps(targets),
+    }
 
-        input_definition["targets"] = json.dumps(targets)
-        inputs.append(input_definition)
 
+def generate_r2c_input(out_file):
+    from .package import PypiPackage
+
+    # Input definitions are streamed into the output as the full PyPI listing does not fit comfortably in memory
     out_file.write(
-        json.dumps(
+        '{"name": "aura", "version": "0.0.1", "description": "This is a set of all PyPI packages", "inputs": ['
+    )
+    first = True
+    max_workers = 64
+
+    # Fetching the package metadata is bound by the network latency of PyPI API requests
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        inputs = bounded_map(executor, _fetch_r2c_input, PypiPackage.list_packages(), max_pending=max_workers * 2)
+        for input_definition in inputs:
+            if input_definition is None:
+                continue
+
+            if not first:
+                out_file.write(", ")
+            first = False
+            out_file.write(dumps(input_definition))
+
+    out_file.write("]}")
+
+
+def _r2c_scan_source(src: str, metadata: dict, base: str) -> dict:
+    """
+    Scan a single r2c source and translate the detections into the r2c results format
+    """
+    out = {"results": [], "errors": []}
+    # Both branches of the path computation below must agree, the prefix check requires a normalized base
+    base = os.path.normpath(os.path.abspath(base))
+    base_prefix = base + os.sep
+    relpath = os.path.relpath
+    append_result = out["results"].append
+
+    logger.info(f"Enumerating {src} with metadata: {metadata}")
+
+    try:
+        for detection in scan_uri(src, metadata=dict(metadata)):
+            hit = detection._asdict()
+            rhit = {"check_id": hit.pop("type"), "extra": hit}
+            line_no = hit.get("line_no")
+
+            if line_no is not None:
+                location = hit["location"]
+                rhit["start"] = {"line": line_no}
+                if location.startswith(base_prefix):
+                    rhit["path"] = location[len(base_prefix):]
+                else:
+                    rhit["path"] = relpath(location, base)
+
+            append_result(rhit)
+
+    except Exception as exc:
+        exc_tb = sys.exc_info()[-1]
+
+        out["errors"].append(
             {
-                "name": "aura",
-                "version": "0.0.1",
-                "description": "This is a set of all PyPI packages",
-                "inputs": inputs,
+                "message": f"[{exc_tb.tb_lineno}] An exception occurred: {str(exc)}",
+                "data": {"path": str(src)},
             }
         )
-    )
+
+    return out
 
 
 def r2c_scan(source, out_file, mode="generic"):
+    from prettyprinter import pprint
+
     out = {"results": [], "errors": []}
 
     pkg_metadata = {}
 
-    metadata = {"format": "none"}
+    metadata = {"format": ()}
 
     if mode == "pypi":
         logger.info("R2C mode set to PyPI")
@@ -271,7 +419,7 @@ def r2c_scan(source, out_file, mode="generic"):
         meta_loc = location / "metadata.json"
         if meta_loc.is_file():
             with open(location / "metadata.json", "r") as fd:
-                pkg_metadata = json.loads(fd.read())
+                pkg_metadata = loads(fd.read())
                 metadata.update(
                     {
                         "package_type": pkg_metadata.get("packagetype"),
@@ -279,38 +427,41 @@ def r2c_scan(source, out_file, mode="generic"):
                         "python_version": pkg_metadata.get("python_version"),
                     }
                 )
-        source = [
-            os.fspath(x.absolute())
-            for x in location.iterdir()
-            if x.name != "metadata.json"
-        ]
+        with os.scandir(os.path.abspath(location)) as entries:
+            source = [x.path for x in entries if x.name != "metadata.json"]
     else:
         logger.info("R2C mode set to generic")
 
-    for src in source:
-        logger.info(f"Enumerating {src} with metadata: {metadata}")
+    base = os.path.abspath(source[0] if source else os.curdir)
+    worker = partial(_r2c_scan_source, metadata=metadata, base=base)
 
-        try:
-            data = scan_uri(src, metadata=metadata)
-
-            for loc in data:
-                for hit in loc["hits"]:
-                    rhit = {"check_id": hit.pop("type"), "extra": hit}
-                    if "line_no" in hit:
-                        rhit["start"] = {"line": hit["line_no"]}
-                        rhit["path"] = os.path.relpath(hit["location"], source[0])
-
-                    out["results"].append(rhit)
+    # Sources are independent of each other, scan them in separate processes if there is more than one
+    if len(source) > 1:
+        executor = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_scan_worker)
+        jobs = [executor.submit(worker, src) for src in source]
+    else:
+        executor = None
+        jobs = None
 
-        except Exception as exc:
-            exc_tb = sys.exc_info()[-1]
+    try:
+        for idx, src in enumerate(source):
+            if jobs is None:
+                partial_out = worker(src)
+            else:
+                try:
+                    partial_out = jobs[idx].result()
+                except BrokenProcessPool as exc:
+                    # A crashed worker fails all the sources that were not finished yet, report them instead of losing the results
+                    partial_out = {
+                        "results": [],
+                        "errors": [{"message": f"Scan worker terminated abruptly: {exc}", "data": {"path": str(src)}}]
+                    }
 
-            out["errors"].append(
-                {
-                    "message": f"[{exc_tb.tb_lineno}] An exception occurred: {str(exc)}",
-                    "data": {"path": str(src)},
-                }
-            )
+            out["results"].extend(partial_out["results"])
+            out["errors"].extend(partial_out["errors"])
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     pprint(out)
-    out_file.write(json.dumps(out, default=utils.json_encoder))
+    out_file.write(dumps(out))
@@ -5,16 +5,16 @@ import typing
 import time
 import resource
 import logging
+import hashlib
 import warnings
 import concurrent.futures
-from importlib import resources
+from importlib import resources, metadata
 from pathlib import Path
 from functools import lru_cache
 from logging.handlers import RotatingFileHandler
 from typing import Optional, Generator
 
 import tqdm
-import pkg_resources
 import ruamel.yaml
 from ruamel.yaml import YAML, composer
 try:
@@ -33,7 +33,10 @@ LOG_ERR = None
 # This is used to trigger breakpoint during AST traversing of specific lines
 DEBUG_LINES = set()
 DEFAULT_AST_STAGES = ("convert", "rewrite", "ast_pattern_matching", "taint_analysis", "readonly")
+DEFAULT_FILE_HASHES = ("sha256", "tlsh")
 AST_PATTERNS_CACHE = None
+MAX_DEPTH_CACHE: Optional[int] = None
+FILE_HASHES_CACHE: Optional[typing.Tuple[str, ...]] = None
 PROGRESSBAR_DISABLED = ("AURA_NO_PROGRESS" in os.environ)
 
 DEFAULT_CFG_PATH = "aura.data.aura_config.yaml"
@@ -199,10 +202,12 @@ def parse_config(pth, default_pth):
 
 
 def load_config():
-    global SEMANTIC_RULES, CFG, CFG_PATH
+    global SEMANTIC_RULES, CFG, CFG_PATH, MAX_DEPTH_CACHE, FILE_HASHES_CACHE
 
     CFG_PATH = str(find_configuration())
     CFG = parse_config(CFG_PATH, DEFAULT_CFG_PATH)
+    MAX_DEPTH_CACHE = None
+    FILE_HASHES_CACHE = None
 
     if "AURA_SIGNATURES" in os.environ:
         semantic_sig_pth = os.environ["AURA_SIGNATURES"]
@@ -219,6 +224,8 @@ def load_config():
         )
 
     configure_logger(log_level)
+    # Validated here so the invalid configuration is reported once and not by every scanned file
+    get_file_hashes()
 
     if not sys.warnoptions:
         w_filter = CFG["aura"].get("warnings", "default")
@@ -267,13 +274,36 @@ def get_maximum_archive_size() ->typing.Optional[int] :
     return size
 
 
+def get_max_depth() -> int:
+    """
+    Maximum depth of the recursive processing (e.g. unpacking of nested archives)
+    The value is checked for every scan location so it is cached until the config is reloaded
+    """
+    global MAX_DEPTH_CACHE
+
+    if MAX_DEPTH_CACHE is None:
+        MAX_DEPTH_CACHE = int(CFG["aura"].get("max-depth", 5))
+    return MAX_DEPTH_CACHE
+
+
 def get_default_tag_filters() -> typing.List[str]:
     tags = CFG.get("tags", [])
     return tags
 
 
+def iter_entry_points(group: str) -> typing.Iterable[metadata.EntryPoint]:
+    """
+    Return the installed entry points for the given group
+    importlib.metadata is used instead of pkg_resources as it does not need to scan all distributions on import
+    """
+    if sys.version_info >= (3, 10):
+        return metadata.entry_points(group=group)
+    else:
+        return metadata.entry_points().get(group, ())
+
+
 def get_installed_stages() -> typing.Generator[str,None,None]:
-    for x in pkg_resources.iter_entry_points("aura.ast_visitors"):
+    for x in iter_entry_points("aura.ast_visitors"):
         yield x.name
 
 
@@ -282,6 +312,34 @@ def get_ast_stages() -> typing.Tuple[str,...]:
     return [x for x in cfg_value if x]
 
 
+def get_file_hashes() -> typing.Tuple[str, ...]:
+    """
+    Digests computed for every scanned file
+    Invalid configuration is logged and the default digests are used instead
+
+    :return: names of the hash algorithms
+    """
+    global FILE_HASHES_CACHE
+
+    if FILE_HASHES_CACHE is None:
+        cfg_value = CFG["aura"].get("hashes") or DEFAULT_FILE_HASHES
+        # Variable length digests (shake_*) are not supported as they require the digest length
+        supported = {x for x in hashlib.algorithms_available if not x.startswith("shake_")} | {"tlsh"}
+
+        if not isinstance(cfg_value, (list, tuple)):
+            logger.warning(f"Invalid `hashes` configuration, expected a list of hash names: {cfg_value!r}")
+            cfg_value = DEFAULT_FILE_HASHES
+        else:
+            unknown = [x for x in cfg_value if x and not (isinstance(x, str) and x in supported)]
+            if unknown:
+                logger.warning(f"Unsupported hash algorithms in the `hashes` configuration: {unknown!r}")
+                cfg_value = DEFAULT_FILE_HASHES
+
+        FILE_HASHES_CACHE = tuple(x for x in cfg_value if x)
+
+    return FILE_HASHES_CACHE
+
+
 def get_ast_patterns():
     global AST_PATTERNS_CACHE
     from .pattern_matching import ASTPattern
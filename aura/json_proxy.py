@@ -5,7 +5,28 @@ from .utils import json_encoder
 
 try:
     from rapidjson import loads, dumps as rdumps, JSONDecodeError
-    dumps = partial(rdumps, default=json_encoder)
+    _dumps = partial(rdumps, default=json_encoder)
 except ImportError:
     from json import loads, dumps as ndumps, JSONDecodeError
-    dumps = partial(ndumps, default=json_encoder)
+    _dumps = partial(ndumps, default=json_encoder)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is None:
+    dumps = _dumps
+else:
+    # Dataclasses and datetime objects are passed to the `json_encoder` to keep the same output as other backends
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(obj, **kwargs) -> str:
+        if kwargs:
+            return _dumps(obj, **kwargs)
+
+        try:
+            return orjson.dumps(obj, default=json_encoder, option=ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:  # orjson does not support for example integers exceeding the 64-bit range
+            return _dumps(obj)
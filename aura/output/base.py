@@ -6,8 +6,7 @@ from dataclasses import dataclass, field
 from urllib import parse
 from typing import List, Union, Mapping, Optional, Iterable
 
-import pkg_resources
-
+from .. import config
 from .. import exceptions
 from ..type_definitions import DiffType, DiffAnalyzerType
 
@@ -38,7 +37,7 @@ class OutputBase(metaclass=ABCMeta):
         handlers = OUTPUT_HANDLER_CACHE.setdefault(cls.entrypoint(), {})
 
         if not handlers:
-            for x in pkg_resources.iter_entry_points(cls.entrypoint()):
+            for x in config.iter_entry_points(cls.entrypoint()):
                 handler = x.load()
                 handlers[x.name] = handler
 
@@ -64,6 +63,7 @@ class ScanOutputBase(OutputBase, metaclass=ABCMeta):
     output_location: str = "-"
     tag_filters: list = field(default_factory=list)
     verbosity: int = 1
+    _feed_buffer: list = field(default_factory=list, repr=False)
 
     @abstractmethod
     def __enter__(self):
@@ -130,6 +130,54 @@ class ScanOutputBase(OutputBase, metaclass=ABCMeta):
     def output(self, hits, scan_metadata: dict):
         ...
 
+    def feed(self, hit):
+        """
+        Consume a single hit as it is produced by the scan
+        Hits that would be dropped by the output filters are discarded right away instead of being retained until the end of the scan
+
+        :param hit: hit/result to be buffered for the output
+        """
+        if self.accepts(hit):
+            self._feed_buffer.append(hit)
+
+    def flush(self, scan_metadata: dict):
+        """
+        Output all the hits consumed via `feed` and reset the buffer
+        Nothing is written (including opening the output location) if the minimum score is not reached
+        """
+        hits, self._feed_buffer = self._feed_buffer, []
+
+        # Buffered hits already passed the filters in `feed`, check the score before paying for the sort
+        try:
+            self.check_min_score(hits)
+        except exceptions.MinimumScoreNotReached:
+            return
+
+        hits.sort()
+        with self:
+            self.output(hits=hits, scan_metadata=scan_metadata)
+
+    def accepts(self, hit) -> bool:
+        """
+        Check if the hit passes the configured output filters
+
+        :param hit: input hit/result
+        :return: True if the hit should be included in the output
+        """
+        # normalize tags
+        tags = [t.lower().replace('-', '_') for t in hit.tags]
+
+        # if verbosity is below 2, informational results are filtered
+        # norm is that informational results should have a score of 0
+        if self.verbosity < 2 and hit.informational and hit.score == 0:
+            return False
+        elif not all(f(tags) for f in self.tag_filters):
+            return False
+        elif self.verbosity < 3 and hit.name == "ASTParseError" and hit._metadata.get("source") == "blob":
+            return False
+        else:
+            return True
+
     def filtered(self, hits):
         """
         Helper function get a list of filtered results regardless of the output type
@@ -138,32 +186,21 @@ class ScanOutputBase(OutputBase, metaclass=ABCMeta):
         :param hits: input hits/results that will be filtered
         :return: a list of filtered results
         """
-        hits = sorted(hits)
-
-        processed = []
-
-        for x in hits:
-            # normalize tags
-            tags = [t.lower().replace('-', '_') for t in x.tags]
-
-            # if verbosity is below 2, informational results are filtered
-            # norm is that informational results should have a score of 0
-            if self.verbosity < 2 and x.informational and x.score == 0:
-                continue
-            elif not all(f(tags) for f in self.tag_filters):
-                continue
-            elif self.verbosity < 3 and x.name == "ASTParseError" and x._metadata.get("source") == "blob":
-                continue
-            else:
-                processed.append(x)
+        processed = [x for x in sorted(hits) if self.accepts(x)]
+        self.check_min_score(processed)
+        return processed
 
-        total_score = sum(x.score for x in processed)
+    def check_min_score(self, hits):
+        """
+        :raises exceptions.MinimumScoreNotReached: if the total score of the hits is below the configured minimum
+        """
+        if not self.min_score:
+            return
 
-        if self.min_score and self.min_score > total_score:
+        total_score = sum(x.score for x in hits)
+        if self.min_score > total_score:
             raise exceptions.MinimumScoreNotReached(f"Score of {total_score} did not meet the minimum {self.min_score}")
 
-        return processed
-
 
 @dataclass()
 class DiffOutputBase(OutputBase, metaclass=ABCMeta):
@@ -101,12 +101,15 @@ class SARIFOutput(JSONScanOutput):
                 "uri": detection.scan_location.location.as_uri()
             },
             "length": detection.scan_location.size,
-            "hashes": {
-                "md5": detection.scan_location.metadata["md5"],
-                "sha-1": detection.scan_location.metadata["sha1"],
-                "sha-256": detection.scan_location.metadata["sha256"],
-                "sha-512": detection.scan_location.metadata["sha512"],
-                "tlsh": detection.scan_location.metadata["tlsh"]
-            }
+            "hashes": {}
         }
+
+        # The file might not exist anymore (e.g. extracted archive content), only the already computed digests are reported
+        detection.scan_location.wait_for_hashes()
+        metadata = detection.scan_location.metadata
+        for sarif_name, name in (("md5", "md5"), ("sha-1", "sha1"), ("sha-256", "sha256"), ("sha-512", "sha512"), ("tlsh", "tlsh")):
+            digest = metadata.get(name)
+            if digest is not None:
+                artifact["hashes"][sarif_name] = digest
+
         return artifact
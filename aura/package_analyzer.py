@@ -86,6 +86,7 @@ class Analyzer(object):
     def analyze(location: base.ScanLocation) -> Tuple[List[base.ScanLocation], List[Detection]]:
         locations = []
         detections = []
+        location.wait_for_hashes()
 
         logger.debug(f"Analyzing file '{location.str_location}' {location.metadata.get('mime')}")
         analyzers = plugins.get_analyzer_group(location.metadata.get("analyzers", []))
@@ -119,11 +120,12 @@ class Analyzer(object):
         logger.debug("Computing import graph")
 
         for x in collected:
-            if not x.metadata.get('py_imports'):
+            imports = x.get_imports()
+            if not imports:
                 continue
 
             node = Path(x.location).absolute()
-            topo.add_edge(node, x.metadata['py_imports']['dependencies'])
+            topo.add_edge(node, imports['dependencies'])
 
         topology = topo.sort()
 
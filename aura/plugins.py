@@ -1,10 +1,10 @@
 import inspect
 import importlib
 import importlib.util
+import threading
 from typing import List, Optional
 
-import pkg_resources
-
+from . import config
 from . import exceptions
 from .type_definitions import AnalyzerType, ScanLocation
 from .analyzers.base import NodeAnalyzerV2
@@ -13,6 +13,8 @@ from .analyzers.python.visitor import Visitor
 from .analyzers.python.readonly import ReadOnlyAnalyzer
 
 PLUGIN_CACHE = {}
+# Prevents concurrent scans from initializing (and registering hooks of) the same plugins twice
+PLUGIN_LOCK = threading.Lock()
 
 
 def initialize_analyzer(analyzer: AnalyzerType) -> AnalyzerType:
@@ -36,24 +38,28 @@ def load_entrypoint(name: str, names=None) -> dict:
     if PLUGIN_CACHE.get(name):
         return PLUGIN_CACHE[name]
 
-    data = {
-        "entrypoints": {},
-        "disabled": [],
-    }
-    for x in pkg_resources.iter_entry_points(name):
-        if names and x.name not in names:
-            # Prevent AST analyzers from being loaded if they are not specified in the names
-            continue
+    with PLUGIN_LOCK:
+        if PLUGIN_CACHE.get(name):
+            return PLUGIN_CACHE[name]
 
-        try:
-            plugin = x.load()
-            data["entrypoints"][x.name] = initialize_analyzer(plugin)
-        except (exceptions.FeatureDisabled, ImportError) as exc:
-            msg = exc.args[0]
-            data["disabled"].append((x.name, msg))
+        data = {
+            "entrypoints": {},
+            "disabled": [],
+        }
+        for x in config.iter_entry_points(name):
+            if names and x.name not in names:
+                # Prevent AST analyzers from being loaded if they are not specified in the names
+                continue
 
-    PLUGIN_CACHE[name] = data
-    return data
+            try:
+                plugin = x.load()
+                data["entrypoints"][x.name] = initialize_analyzer(plugin)
+            except (exceptions.FeatureDisabled, ImportError) as exc:
+                msg = exc.args[0]
+                data["disabled"].append((x.name, msg))
+
+        PLUGIN_CACHE[name] = data
+        return data
 
 
 def get_analyzers(names: Optional[List[str]]=None) -> List[AnalyzerType]:
@@ -1,18 +1,33 @@
 # -*- coding: utf-8 -*-
+import os
 import json
+import heapq
 import difflib
 import itertools
+import operator
 import xmlrpc.client
+from functools import partial
+from collections import Counter, defaultdict
 from pathlib import Path
-from typing import Optional, Generator, Iterable, Tuple, Callable, List
+from typing import Optional, Generator, Iterable, Tuple, Callable, List, Set
 
 from packaging.utils import canonicalize_name
 
+try:
+    import numpy
+    from numba import njit
+except ImportError:
+    numpy = None
+    njit = None
+
 from . import config
+from . import cache
+from .exceptions import InvalidConfiguration
 
 
 logger = config.get_logger(__name__)
 WAREHOUSE_XML_RPC = "https://pypi.python.org/pypi"
+QGRAM_SIZE = 2
 
 
 def threshold_or_default(threshold: Optional[int]) -> int:
@@ -33,10 +48,95 @@ def get_all_pypi_packages() -> Generator[str, None, None]:
     yield from map(canonicalize_name, repo.list_packages())
 
 
+if njit is not None:
+    @njit(cache=True)
+    def _dl_core(s1, s2, max_distance: int) -> int:
+        """
+        JIT compiled core of the `damerau_levenshtein` computation operating on arrays of code points
+        Mirrors the pure python implementation, `s1` must not be longer than `s2`
+
+        :return: computed distance or -1 if the computation was stopped because the max distance was reached
+        """
+        l1, l2 = len(s1), len(s2)
+        # Rows of the simulated matrix: 0 - transposition row, 1 - previous row, 2 - current row
+        rows = numpy.empty((3, l1 + 1), numpy.int32)
+        for col in range(l1 + 1):
+            rows[2, col] = col
+
+        t, p, c = 0, 1, 2
+
+        for row in range(1, l2 + 1):
+            t, p, c = p, c, t
+            rows[c, 0] = row
+
+            if row > 1:
+                row_min = rows[t, 0]
+                for col in range(1, l1 + 1):
+                    if rows[t, col] < row_min:
+                        row_min = rows[t, col]
+
+                if row_min >= max_distance:
+                    return -1
+
+            for col in range(1, l1 + 1):
+                cost = rows[c, col - 1] + 1
+                deletion = rows[p, col] + 1
+                if deletion < cost:
+                    cost = deletion
+
+                change = rows[p, col - 1]
+                if s1[col - 1] != s2[row - 1]:
+                    change += 1
+                if change < cost:
+                    cost = change
+
+                if 1 < row <= col and s1[col - 1] == s2[col - 2] and s2[col - 1] == s1[col - 2]:
+                    transposition = rows[t, col - 2] + 1
+                    if transposition < cost:
+                        cost = transposition
+
+                rows[c, col] = cost
+
+        return rows[c, l1]
+else:
+    _dl_core = None
+
+
+def _to_code_points(s: str):
+    return numpy.frombuffer(s.encode("utf-32-le"), dtype=numpy.uint32)
+
+
 def damerau_levenshtein(s1: str, s2: str, max_distance: int=3, cap=None) -> int:
     """
     Compute damerau-levenshtein distance of two strings
     This algorithm is optimized to stop computation of distance once the max distance was reached
+    JIT compiled version of the algorithm is used if `numba` is installed
+
+    :param s1: first string
+    :param s2: second string
+    :param max_distance: maximum allowed distance
+    :param cap: cap the max distance or return a given cap value if max_distance was reached
+    """
+    if _dl_core is None:
+        return _damerau_levenshtein(s1, s2, max_distance=max_distance, cap=cap)
+
+    s1, s2 = (s1, s2) if len(s1) <= len(s2) else (s2, s1)
+    distance = _dl_core(_to_code_points(s1), _to_code_points(s2), max_distance)
+
+    if distance == -1:
+        if cap is True:
+            return max_distance
+        else:
+            return cap
+    elif distance > max_distance:
+        return None
+    else:
+        return distance
+
+
+def _damerau_levenshtein(s1: str, s2: str, max_distance: int=3, cap=None) -> int:
+    """
+    Pure python implementation of the `damerau_levenshtein`, used as a fallback if `numba` is not available
 
     Original Source:
     https://gist.githubusercontent.com/giststhebearbear/4145811/raw/7ae7fc157ee9aebedafc10320bf6349374d52fdd/leven.py
@@ -150,10 +250,70 @@ def diff_distance(s1, s2, cutoff=0.8, cut_return=None):
         return cut_return
 
 
+def qgrams(name: str, size: int=QGRAM_SIZE) -> Set[str]:
+    """
+    Return a set of all substrings (q-grams) of a given size contained in the name
+    """
+    return {name[i:i+size] for i in range(len(name) - size + 1)}
+
+
+def candidate_pairs(
+        popular: Iterable[str],
+        full_list: Iterable[str],
+        max_distance: int
+) -> Generator[Tuple[str, str], None, None]:
+    """
+    Generate pairs of (popular, other) package names that could be within the `max_distance` edit distance
+    This is a cheap pre-filter to avoid computing the distance for every combination of the package names:
+
+    - length of the names can't differ by more than `max_distance`
+    - each edit operation (transposition included) can remove at most `QGRAM_SIZE + 1` q-grams of the name,
+      names that do not share enough q-grams with the popular package name are skipped
+    """
+    buckets = defaultdict(list)
+    qgram_index = defaultdict(set)
+    names_count = 0
+    total = 0
+    emitted = 0
+
+    for name in full_list:
+        names_count += 1
+        buckets[len(name)].append(name)
+        for gram in qgrams(name):
+            qgram_index[gram].add(name)
+
+    for pkg in popular:
+        total += names_count
+        grams = qgrams(pkg)
+        min_shared = len(grams) - max_distance * (QGRAM_SIZE + 1)
+        pkg_len = len(pkg)
+
+        if min_shared <= 0:  # Name is too short for the q-gram filter to be applicable
+            candidates = itertools.chain.from_iterable(
+                buckets.get(x, ()) for x in range(pkg_len - max_distance, pkg_len + max_distance + 1)
+            )
+        else:
+            shared = Counter()
+            for gram in grams:
+                shared.update(qgram_index.get(gram, ()))
+
+            candidates = (
+                name for name, count in shared.items()
+                if count >= min_shared and abs(len(name) - pkg_len) <= max_distance
+            )
+
+        for name in candidates:
+            emitted += 1
+            yield (pkg, name)
+
+    logger.debug(f"Typosquatting pre-filter emitted {emitted} candidate pairs out of {total} total pairs")
+
+
 def generate_popular(
         json_path: Path,
         full_list: Optional[Iterable[str]]=None,
-        download_threshold: Optional[int]=None
+        download_threshold: Optional[int]=None,
+        max_distance: Optional[int]=None
 ):
     if not json_path.exists():
         raise ValueError(f"PyPI stats file does not exists: {json_path}")
@@ -178,7 +338,10 @@ def generate_popular(
 
     full_list -= popular
 
-    yield from itertools.product(popular, full_list)
+    if max_distance is None:
+        yield from itertools.product(popular, full_list)
+    else:
+        yield from candidate_pairs(popular, full_list, max_distance)
 
 
 def enumerator(
@@ -196,6 +359,29 @@ def enumerator(
             yield (pkg1, pkg2)
 
 
+def nearest(
+        generator: Generator[Tuple[str, str], None, None],
+        method: Callable[[str, str], int],
+        topk: int
+) -> Generator[Tuple[str, str], None, None]:
+    """
+    Yield at most `topk` closest matches for each popular package
+    Unlike `enumerator`, which yields only the pairs at distance 1, every pair within the max distance of the `method`
+    is a candidate; matches are ranked by the distance returned by the `method`,
+    equal distances are ranked by the similarity ratio as computed by `diff_distance`
+    Package pairs produced by the `generator` must be grouped by the first (popular) package name
+    which is the case for both the full product and the q-gram pre-filter from `generate_popular`
+    """
+    for pkg1, group in itertools.groupby(generator, key=operator.itemgetter(0)):
+        scored = ((method(pkg1, pkg2), pkg2) for _, pkg2 in group)
+        matches = (
+            (res, -diff_distance(pkg1, pkg2, cutoff=0.0)[2], pkg2) for res, pkg2 in scored if res
+        )
+
+        for *_, pkg2 in heapq.nsmallest(topk, matches):
+            yield (pkg1, pkg2)
+
+
 def check_name(name: str, full_list: bool=False, download_threshold: Optional[int]=None) -> List[str]:
     """
     Check a name of a package if it is a possible typosquatting package
@@ -211,6 +397,26 @@ def check_name(name: str, full_list: bool=False, download_threshold: Optional[in
     """
     download_threshold = threshold_or_default(download_threshold)
     name = canonicalize_name(name)
+    compute = partial(_check_name, name, full_list, download_threshold)
+
+    if cache.Cache.get_location() is None:
+        return compute()
+
+    try:
+        stats_pth = config.get_pypi_stats_path().resolve()
+        stats = stats_pth.stat()
+    except (OSError, InvalidConfiguration):
+        return compute()
+
+    # Cached results are invalidated when the pypi stats dataset is updated or a different one is configured
+    return cache.Cache.proxy_typos(
+        name=name,
+        cache_key=[os.fspath(stats_pth), stats.st_size, stats.st_mtime_ns, full_list, download_threshold],
+        compute=compute
+    )
+
+
+def _check_name(name: str, full_list: bool, download_threshold: int) -> List[str]:
     typos = []
 
     for line in config.iter_pypi_stats():
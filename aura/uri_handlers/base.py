@@ -7,21 +7,24 @@ import urllib.parse
 import mimetypes
 import tempfile
 import shutil
-import copy
+import mmap
 import hashlib
+import threading
 from abc import ABC, abstractmethod
-from itertools import product
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, Future
 from dataclasses import dataclass, field
 from pathlib import Path
+from stat import S_ISREG
 from typing import Union, Optional, Generator, Tuple, Iterable
 from warnings import warn
 
 import tlsh
-import pkg_resources
 import magic
 
 from .. import config
-from ..utils import KeepRefs, lookup_lines
+from ..utils import lookup_lines
 from ..exceptions import PythonExecutorError, UnsupportedDiffLocation, FeatureDisabled
 from ..analyzers import find_imports
 from ..analyzers.detections import DataProcessing, Detection, get_severity
@@ -29,7 +32,35 @@ from ..analyzers.detections import DataProcessing, Detection, get_severity
 
 logger = config.get_logger(__name__)
 HANDLERS = {}
+DISABLED_HANDLERS = {}
+# Handlers that override the `is_supported` check and can't be looked up just by the URI scheme
+CUSTOM_HANDLERS = []
 CLEANUP_LOCATIONS = set()
+PYTHON_MIME_TYPES = frozenset(("text/x-python", "text/x-script.python"))
+# libmagic results that are too generic, mime type is guessed from the file extension instead
+GENERIC_MIME_TYPES = frozenset(("text/plain", "application/octet-stream", "text/none"))
+# Children created inside the temp dir (e.g. extracted archives) are stripped to their own location
+_TMPDIR = os.fspath(tempfile.gettempdir())
+_TMPDIR_PREFIX = _TMPDIR if _TMPDIR.endswith(os.sep) else (_TMPDIR + os.sep)
+# Size of the blocks in which the file content is streamed into the hash functions
+HASH_BLOCK_SIZE = 1024 * 1024
+# Files above this size are hashed via mmap in blocks of MMAP_BLOCK_SIZE
+MMAP_HASH_THRESHOLD = 16 * 1024 * 1024
+MMAP_BLOCK_SIZE = 4 * 1024 * 1024
+# TLSH can't produce a digest for content smaller than this in any release (4.x), older releases require more
+# content which is handled by the ValueError when computing the digest
+TLSH_MIN_SIZE = 50
+# Per thread state: hashing read buffer reused between files and libmagic instance
+_THREAD_STATE = threading.local()
+# Digests of already hashed files keyed by (st_dev, st_ino, st_mtime_ns, st_size), evicted in LRU order
+HASH_CACHE = OrderedDict()
+HASH_CACHE_SIZE = 4096
+HASH_CACHE_LOCK = threading.Lock()
+# File digests are computed in the background by this pool, the hashing state is reset in the forked processes
+HASH_POOL: Optional[ThreadPoolExecutor] = None
+HASH_POOL_LOCK = threading.Lock()
+# Metadata keys of the file digests, these are not inherited by the child locations
+DIGEST_NAMES = frozenset(hashlib.algorithms_available) | {"tlsh"}
 
 
 class URIHandler(ABC):
@@ -45,45 +76,64 @@ class URIHandler(ABC):
 
     @classmethod
     def from_uri(cls, uri: str) -> Optional[URIHandler]:
-        parsed = urllib.parse.urlparse(uri)
+        parsed = _parse_uri(uri)
         cls.load_handlers()
-
-        for handler in HANDLERS.values():
-            if handler.is_supported(parsed):
-                return handler(parsed)
-
-        return cls.default(parsed)
+        return cls.lookup_handler(parsed)(parsed)
 
     @classmethod
     def diff_from_uri(cls, uri1: str, uri2: str) -> Tuple[URIHandler, URIHandler]:
         cls.load_handlers()
-        parsed1 = urllib.parse.urlparse(uri1)
-        parsed2 = urllib.parse.urlparse(uri2)
+        parsed1 = _parse_uri(uri1)
+        parsed2 = _parse_uri(uri2)
+        return (cls.lookup_handler(parsed1)(parsed1), cls.lookup_handler(parsed2)(parsed2))
+
+    @classmethod
+    def lookup_handler(cls, parsed_uri: urllib.parse.ParseResult):
+        """
+        Find the handler class for the parsed URI
+        Handler is looked up directly by the URI scheme first, handlers with a custom `is_supported` check are the fallback
+        Handlers must be already loaded via `load_handlers`
+        """
+        handler = HANDLERS.get(parsed_uri.scheme)
+        if handler is not None and (handler not in CUSTOM_HANDLERS or handler.is_supported(parsed_uri)):
+            return handler
 
-        for handler1, handler2 in product(HANDLERS.values(), repeat=2):
-            if handler1.is_supported(parsed1) and handler2.is_supported(parsed2):
-                return (handler1(parsed1), handler2(parsed2))
+        for handler in CUSTOM_HANDLERS:
+            if handler.is_supported(parsed_uri):
+                return handler
 
-        return (cls.default(parsed1), cls.default(parsed2))
+        return cls.default
 
     @classmethod
     def load_handlers(cls, ignore_disabled=True):
+        """
+        Load the URI handlers from the entrypoint
+        Entrypoints are loaded only once, both enabled and disabled handlers are cached for the subsequent calls
+
+        :param ignore_disabled: If False, mapping of disabled handler names to the reason is included under the `disabled` key
+        :return: mapping of URI scheme to the handler class
+        """
         global HANDLERS
 
         if not HANDLERS:
             handlers = {}
-            for x in pkg_resources.iter_entry_points("aura.uri_handlers"):
+            for x in config.iter_entry_points("aura.uri_handlers"):
                 try:
                     hook = x.load()
                     handlers[hook.scheme] = hook
+                    if hook.is_supported.__func__ is not URIHandler.is_supported.__func__:
+                        CUSTOM_HANDLERS.append(hook)
                     if hook.default and not cls.default:
                         cls.default = hook
                 except FeatureDisabled as exc:
-                    if not ignore_disabled:
-                        handlers.setdefault("disabled", {})[x.name] = exc.args[0]
+                    DISABLED_HANDLERS[x.name] = exc.args[0]
 
             HANDLERS = handlers
-        return HANDLERS
+
+        if ignore_disabled:
+            return HANDLERS
+        else:
+            return dict(HANDLERS, disabled=dict(DISABLED_HANDLERS))
 
     @property
     def metadata(self) -> dict:
@@ -100,6 +150,13 @@ class URIHandler(ABC):
     def get_diff_paths(self, other: URIHandler) -> Generator[Tuple[ScanLocation, ScanLocation], None, None]:
         raise UnsupportedDiffLocation()
 
+    def drop_location(self, location: ScanLocation):
+        """
+        Release the data of a single location returned by `get_paths` as soon as it has been scanned
+        Handler cleanup is still performed afterwards so this must be safe to combine with `cleanup`
+        """
+        pass
+
     def cleanup(self):
         pass
 
@@ -112,7 +169,7 @@ class PackageProvider(ABC):
 
 
 @dataclass
-class ScanLocation(KeepRefs):
+class ScanLocation:
     location: Union[Path, str]
     metadata: dict = field(default_factory=dict)
     cleanup: bool = False
@@ -131,60 +188,168 @@ class ScanLocation(KeepRefs):
             CLEANUP_LOCATIONS.add(self.location)
 
         self.__str_parent = None
-        self.metadata["path"] = self.location
-        self.metadata["normalized_path"] = str(self)
-        self.metadata["tags"] = set()
-
-        if self.metadata.get("depth") is None:
-            self.metadata["depth"] = 0
+        # Background digest computation and the names of the digests it computes
+        self.__hash_future: Optional[Tuple[Future, Tuple[str, ...]]] = None
+        # Prefixes used by `strip`, strip path can be re-assigned so its length is cached together with the path
+        self.__strip_len: Tuple[Optional[str], int] = (None, 0)
+        self.__parent_prefix = (self.str_parent + "$") if self.parent else None
+        metadata = self.metadata
+        metadata["path"] = self.location
+        metadata["normalized_path"] = self.strip(self.__str_location)
+        metadata["tags"] = set()
+
+        if metadata.get("depth") is None:
+            metadata["depth"] = 0
             warn("Depth is not set for the scan location", stacklevel=2)
 
-        if self.location.is_file():
-            self.__compute_hashes()
+        # Single stat call is used both for the file check and for the file size/digest cache key
+        try:
+            stat = os.stat(self.__str_location)
+        except (OSError, ValueError):
+            stat = None
 
-            self.size = self.location.stat().st_size
-            self.metadata["mime"] = magic.from_file(self.str_location, mime=True)
+        if stat is not None and S_ISREG(stat.st_mode):
+            self.size = stat.st_size
+            hashes = config.get_file_hashes()
+            self.__hash_future = (_get_hash_pool().submit(self.__compute_hashes, stat, hashes), hashes)
 
-            if self.metadata["mime"] in ("text/plain", "application/octet-stream", "text/none"):
-                self.metadata["mime"] = mimetypes.guess_type(self.__str_location)[0]
+            mime = _get_mime(self.__str_location)
+            if mime in GENERIC_MIME_TYPES:
+                mime = mimetypes.guess_type(self.__str_location)[0]
+            metadata["mime"] = mime
 
-            if self.is_python_source_code and "no_imports" not in self.metadata:
-                try:
-                    imports = find_imports.find_imports(self.location, metadata=self.metadata)
-                    if imports:
-                        self.metadata["py_imports"] = imports
-                except PythonExecutorError:
-                    pass
 
+    def __getstate__(self):
+        # Digests must be merged into the metadata before the location is sent to a different process
+        self.wait_for_hashes()
+        return self.__dict__
 
-    def __compute_hashes(self):
-        tl = tlsh.Tlsh()
-        md5 = hashlib.md5()
-        sha1 = hashlib.sha1()
-        sha256 = hashlib.sha256()
-        sha512 = hashlib.sha512()
+    def wait_for_hashes(self):
+        """
+        Merge the file digests computed in the background into the metadata, blocking until they are available
+        This is done automatically before the location is analyzed
+        If the digests can't be computed, the error is logged and the digests are recorded as None
+        """
+        if self.__hash_future is not None:
+            future, hashes = self.__hash_future
+            try:
+                digests = future.result()
+            except Exception:
+                logger.exception(f"Could not compute the digests of `{self.__str_location}`")
+                digests = dict.fromkeys(hashes)
+
+            self.metadata.update(digests)
+            self.__hash_future = None
+
+    def __compute_hashes(self, stat: os.stat_result, hashes: Tuple[str, ...]) -> dict:
+        # The same file is often revisited, e.g. by child locations; any change of the file also changes the key
+        # ctime is part of the key as inodes of deleted temp files are reused and extraction can restore the mtime
+        key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size, hashes)
+
+        with HASH_CACHE_LOCK:
+            digests = HASH_CACHE.get(key)
+            if digests is not None:
+                HASH_CACHE.move_to_end(key)
+
+        if digests is None:
+            digests = self.__hash_content(hashes)
+
+            with HASH_CACHE_LOCK:
+                HASH_CACHE[key] = digests
+                if len(HASH_CACHE) > HASH_CACHE_SIZE:
+                    HASH_CACHE.popitem(last=False)
+
+        return digests
+
+    def __hash_content(self, hashes: Tuple[str, ...]) -> dict:
+        tl = tlsh.Tlsh() if ("tlsh" in hashes and self.size >= TLSH_MIN_SIZE) else None
+        hashers = {name: hashlib.new(name) for name in hashes if name != "tlsh"}
+        updates = tuple(h.update for h in hashers.values())
+
+        for block in self.__iter_blocks():
+            for update in updates:
+                update(block)
+            if tl is not None:
+                tl.update(bytes(block))  # TLSH accepts only bytes objects
+
+        digests = {name: h.hexdigest() for name, h in hashers.items()}
+
+        # Digests that can't be computed are stored as None so they are not retried on each request
+        if "tlsh" in hashes:
+            digests["tlsh"] = None
+        if tl is not None:
+            try:
+                tl.final()
+                digests["tlsh"] = tl.hexdigest()
+            except ValueError:  # Content is too short for this TLSH release or does not have enough variation
+                pass
+
+        return digests
+
+    def __iter_blocks(self) -> Generator[memoryview, None, None]:
+        """
+        Iterate over the content of the file
+        Yielded blocks are released once the next block is requested
+        """
+        with open(self.__str_location, "rb", buffering=0) as fd:
+            if self.size > MMAP_HASH_THRESHOLD:
+                # Large files are mapped to memory so they are hashed straight from the page cache without a copy
+                with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                    if hasattr(mm, "madvise"):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+
+                    for offset in range(0, len(mm), MMAP_BLOCK_SIZE):
+                        with view[offset:offset + MMAP_BLOCK_SIZE] as block:
+                            yield block
+                return
+
+            # Reads are bounded by the known file size on an unbuffered fd
+            # so the small files, that are the majority within the packages, are hashed with a single read call
+            buffer = _get_hash_buffer()
+            remaining = self.size
+            offset = 0
+            prefetch = remaining > HASH_BLOCK_SIZE and hasattr(os, "posix_fadvise")
+
+            if prefetch:
+                os.posix_fadvise(fd.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+            while remaining > 0:
+                read = fd.readinto(buffer[:min(remaining, HASH_BLOCK_SIZE)])
+                if not read:  # File was truncated in the meantime
+                    break
+
+                remaining -= read
+                offset += read
+                if prefetch and remaining > 0:
+                    # Kernel fetches the next block in the background while the current one is being hashed
+                    os.posix_fadvise(fd.fileno(), offset, HASH_BLOCK_SIZE, os.POSIX_FADV_WILLNEED)
+
+                yield buffer[:read]
+
+    def get_digest(self, name: str) -> Optional[str]:
+        """
+        Return a digest of the file content
+        Digests not enabled via the `aura.hashes` config option are computed on demand and then stored in the metadata
 
-        with self.location.open("rb") as fd:
-            buffer = fd.read(4096)
+        :param name: name of the digest, e.g. `sha256`, `md5` or `tlsh`
+        :return: hexdigest or None if the location is not a file or the digest can't be computed for the content
+        """
+        return self.get_digests((name,))[name]
 
-            while buffer:
-                tl.update(buffer)
-                md5.update(buffer)
-                sha1.update(buffer)
-                sha256.update(buffer)
-                sha512.update(buffer)
-                buffer = fd.read(4096)
+    def get_digests(self, names: Tuple[str, ...]) -> dict:
+        """
+        Same as `get_digest` for multiple digests, all the missing digests are computed in a single pass over the file
 
-        try:
-            tl.final()
-            self.metadata["tlsh"] = tl.hexdigest()
-        except ValueError:  # TLSH needs at least 256 bytes
-            pass
+        :param names: names of the digests
+        :return: mapping of digest names to the hexdigest or None
+        """
+        self.wait_for_hashes()
+        metadata = self.metadata
+        missing = tuple(x for x in names if x not in metadata)
+        if missing and self.location.is_file():
+            metadata.update(self.__compute_hashes(self.location.stat(), missing))
 
-        self.metadata["md5"] = md5.hexdigest()
-        self.metadata["sha1"] = sha1.hexdigest()
-        self.metadata["sha256"] = sha256.hexdigest()
-        self.metadata["sha512"] = sha512.hexdigest()
+        return {x: metadata.get(x) for x in names}
 
 
     def __str__(self):
@@ -216,16 +381,41 @@ class ScanLocation(KeepRefs):
 
     @property
     def is_python_source_code(self) -> bool:
-        return (self.metadata["mime"] in ("text/x-python", "text/x-script.python"))
+        return (self.metadata["mime"] in PYTHON_MIME_TYPES)
+
+    def get_imports(self) -> Optional[dict]:
+        """
+        Return the dependencies imported by the python source code
+        Imports are discovered only when requested, e.g. for the topology sort of the directory content
+
+        :return: dict with `dependencies` and `unknown` imports or None if there are no imports to resolve
+        """
+        metadata = self.metadata
+        if "py_imports" not in metadata:
+            imports = None
+            if metadata.get("mime") in PYTHON_MIME_TYPES and "no_imports" not in metadata:
+                try:
+                    imports = find_imports.find_imports(self.location, metadata=metadata)
+                except PythonExecutorError:
+                    pass
+
+            metadata["py_imports"] = imports or None
+
+        return metadata["py_imports"]
 
     def create_child(self, new_location: Union[str, Path], metadata=None, **kwargs) -> ScanLocation:
         if metadata is None:
-            metadata = copy.deepcopy(self.metadata)
+            self.wait_for_hashes()
+            # Nested values are never mutated in place by children (`tags` is re-created in `__post_init__`)
+            metadata = dict(self.metadata)
             metadata["depth"] = self.metadata["depth"] + 1
 
-        for x in ("mime", "interpreter_path", "interpreter_name"):
+        for x in ("mime", "py_imports", "interpreter_path", "interpreter_name"):
             metadata.pop(x, None)
 
+        for x in DIGEST_NAMES.intersection(metadata):
+            metadata.pop(x)
+
         metadata["analyzers"] = self.metadata.get("analyzers")
 
         if type(new_location) == str:
@@ -243,7 +433,7 @@ class ScanLocation(KeepRefs):
 
         if "strip_path" in kwargs:
             strip_path = kwargs["strip_path"]
-        elif str_loc.startswith(os.fspath(tempfile.gettempdir())):
+        elif str_loc.startswith(_TMPDIR_PREFIX) or str_loc == _TMPDIR:
             strip_path = str_loc
         else:
             strip_path = self.strip_path
@@ -272,18 +462,23 @@ class ScanLocation(KeepRefs):
         :param target: Path to replace/strip
         :return: normalized path
         """
-        target: str = os.fspath(target)
-
-        if self.strip_path and target.startswith(self.strip_path):
-            size = len(self.strip_path)
-            if self.strip_path[-1] != "/":
-                size += 1
+        if type(target) is not str:
+            target = os.fspath(target)
+
+        strip_path = self.strip_path
+        if strip_path and target.startswith(strip_path):
+            cached_path, size = self.__strip_len
+            if cached_path is not strip_path:
+                size = len(strip_path)
+                if strip_path[-1] != "/":
+                    size += 1
+                self.__strip_len = (strip_path, size)
 
             target = target[size:]
 
-        if self.parent:
-            if not target.startswith(self.str_parent):  # Target might be already stripped
-                target = self.str_parent + "$" + target
+        parent_prefix = self.__parent_prefix
+        if parent_prefix is not None and not target.startswith(self.__str_parent):  # Target might be already stripped
+            target = parent_prefix + target
 
         return target
 
@@ -295,8 +490,7 @@ class ScanLocation(KeepRefs):
 
         :return: True if the processing should continue otherwise an instance of Rule that would halt the processing
         """
-        max_depth = int(config.CFG["aura"].get("max-depth", 5))
-        if self.metadata["depth"] > max_depth:
+        if self.metadata["depth"] > config.get_max_depth():
             d = DataProcessing(
                 message = f"Maximum processing depth reached",
                 extra = {
@@ -316,48 +510,92 @@ class ScanLocation(KeepRefs):
         pp(self)
 
     def post_analysis(self, detections: Iterable[Detection]):
-        encoding = self.metadata.get("encoding") or "utf-8"
+        metadata = self.metadata
+        encoding = metadata.get("encoding") or "utf-8"
         line_numbers = [d.line_no for d in detections if d.line_no is not None and d.line is None]
 
         lines = lookup_lines(self.str_location, line_numbers, encoding=encoding)
+        # Names used by the loop are bound locally as locations can have a large number of detections
+        tags = metadata["tags"]
+        strip = self.strip
+        location = None
 
         for d in detections:
-            d.tags |= self.metadata["tags"]  # Lookup if we can remove this
+            d.tags |= tags  # Lookup if we can remove this
 
             if d.location is None:
-                d.location = str(self)
+                if location is None:
+                    location = str(self)
+                d.location = location
             else:
-                d.location = self.strip(d.location)
+                d.location = strip(d.location)
 
             if d.scan_location is None:
                 d.scan_location = self
 
             if d.line is None:
-                line = lines.get(d.line_no)
-                d.line = line
+                d.line = lines.get(d.line_no)
 
             if d._metadata is None:
-                d._metadata = self.metadata
+                d._metadata = metadata
 
             if d._severity is None:
                 d._severity = get_severity(d)
 
 
-def cleanup_locations():
+@lru_cache(maxsize=4096)
+def _parse_uri(uri: str) -> urllib.parse.ParseResult:
+    # ParseResult is an immutable named tuple, it's safe to share the parsed URIs between handlers
+    return urllib.parse.urlparse(uri)
+
+
+def _get_hash_buffer() -> memoryview:
+    buffer = getattr(_THREAD_STATE, "buffer", None)
+    if buffer is None:
+        buffer = _THREAD_STATE.buffer = memoryview(bytearray(HASH_BLOCK_SIZE))
+    return buffer
+
+
+def _get_hash_pool() -> ThreadPoolExecutor:
+    global HASH_POOL
+
+    with HASH_POOL_LOCK:
+        if HASH_POOL is None:
+            HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="aura_hashing")
+
+        return HASH_POOL
+
+
+def _reset_hash_state():
     """
-    Iterate over all created locations and delete path tree for those marked with cleanup
+    Reset the hashing state in a forked process
+    Threads of the hash pool are not copied into the child, locks they held at the time of fork would never be released
     """
-    for obj in ScanLocation.get_instances():  # type: ScanLocation
-        if not obj.cleanup:
-            continue
+    global HASH_CACHE, HASH_CACHE_LOCK, HASH_POOL, HASH_POOL_LOCK
 
-        if obj.location in CLEANUP_LOCATIONS:
-            CLEANUP_LOCATIONS.remove(obj.location)
+    HASH_CACHE = OrderedDict()
+    HASH_CACHE_LOCK = threading.Lock()
+    HASH_POOL = None
+    HASH_POOL_LOCK = threading.Lock()
 
-        if obj.location.exists():
-            shutil.rmtree(obj.location)
 
-    for location in CLEANUP_LOCATIONS:  # type: Path
+os.register_at_fork(after_in_child=_reset_hash_state)
+
+
+def _get_mime(path: str) -> str:
+    # `magic.from_file` shares a single libmagic instance guarded by a lock which serializes the scan threads
+    mime_magic = getattr(_THREAD_STATE, "magic", None)
+    if mime_magic is None:
+        mime_magic = _THREAD_STATE.magic = magic.Magic(mime=True)
+    return mime_magic.from_file(path)
+
+
+def cleanup_locations():
+    """
+    Delete path tree of all the locations that were marked with cleanup
+    """
+    while CLEANUP_LOCATIONS:
+        location: Path = CLEANUP_LOCATIONS.pop()
         if location.exists():
             shutil.rmtree(location)
 
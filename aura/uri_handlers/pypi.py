@@ -91,6 +91,11 @@ class PyPiHandler(URIHandler, PackageProvider):
         else:
             raise UnsupportedDiffLocation()
 
+    def drop_location(self, location: ScanLocation):
+        # Remove only the files we have downloaded ourselves into a temporary directory
+        if self.opts.get("cleanup", False) and location.location.parent == self.opts["download_dir"]:
+            location.location.unlink(missing_ok=True)
+
     def cleanup(self):
         if self.opts.get("cleanup", False) and self.opts["download_dir"].exists():
             shutil.rmtree(self.opts["download_dir"])
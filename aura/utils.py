@@ -40,6 +40,16 @@ class KeepRefs(Generic[T]):
                 yield inst
 
 
+def as_tuple(obj) -> tuple:
+    """
+    Normalize the object to a tuple, lists and tuples are converted while any other object is wrapped in a tuple
+    """
+    if isinstance(obj, (list, tuple)):
+        return tuple(obj)
+    else:
+        return (obj,)
+
+
 def walk(location: Union[str, Path]) -> Generator[Path, None, None]:
     if not isinstance(location, Path):
         location = Path(location)
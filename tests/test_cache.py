@@ -1,3 +1,4 @@
+import os
 import json
 from unittest import mock
 
@@ -19,3 +20,51 @@ def test_mirror_cache(fixtures, simulate_mirror, tmp_path):
     assert len(cache_content) > 0
     assert "mirror_wheel-0.34.2.tar.gz" in cache_content, cache_content
     assert "mirror_wheel-0.34.2-py2.py3-none-any.whl" in cache_content
+
+
+def test_typos_cache(tmp_path, mock_pypi_stats, monkeypatch):
+    from aura import config, typos
+
+    stats = tmp_path / "pypi_stats.json"
+    stats.write_text("\n".join(json.dumps(x) for x in config.iter_pypi_stats()))
+    monkeypatch.setenv("AURA_PYPI_STATS", str(stats))
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+
+    with mock.patch.object(cache.Cache, 'get_location', return_value=cache_dir), \
+            mock.patch.object(typos, "_check_name", wraps=typos._check_name) as m:
+        first = typos.check_name("pip2")
+        assert typos.check_name("pip2") == first
+        assert m.call_count == 1
+        assert len(list(cache_dir.iterdir())) == 1
+
+        # Update of the stats dataset invalidates the cached entry
+        stat = stats.stat()
+        os.utime(stats, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert typos.check_name("pip2") == first
+        assert m.call_count == 2
+
+        # Different dataset with the same mtime
+        other_stats = tmp_path / "other_stats.json"
+        other_stats.write_text(stats.read_text() + "\n")
+        os.utime(other_stats, ns=(stats.stat().st_atime_ns, stats.stat().st_mtime_ns))
+        monkeypatch.setenv("AURA_PYPI_STATS", str(other_stats))
+        assert typos.check_name("pip2") == first
+        assert m.call_count == 3
+
+
+def test_typos_cache_unsafe_name(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+
+    with mock.patch.object(cache.Cache, 'get_location', return_value=cache_dir):
+        for name in ("../escape", "nested/name"):
+            assert cache.Cache.proxy_typos(name=name, cache_key=[1], compute=lambda: ["x"]) == ["x"]
+            assert cache.Cache.proxy_typos(name=name, cache_key=[1], compute=lambda: ["y"]) == ["x"]
+
+        # Cache entries stay within the cache location
+        assert sorted(x.parent for x in tmp_path.rglob("typos_*")) == [cache_dir, cache_dir]
+
+    # Failure to write the cache entry is not fatal
+    with mock.patch.object(cache.Cache, 'get_location', return_value=tmp_path / "missing"):
+        assert cache.Cache.proxy_typos(name="pip", cache_key=[1], compute=lambda: ["z"]) == ["z"]
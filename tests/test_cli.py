@@ -1,6 +1,7 @@
 import os
 import re
 import json
+import time
 import tempfile
 from pathlib import Path
 from unittest.mock import patch
@@ -175,6 +176,138 @@ def test_r2c_integration():
     assert 'errors' in data
 
 
+@patch("aura.package.PypiPackage.from_pypi")
+@patch("aura.package.PypiPackage.list_packages")
+def test_r2c_generate_input(list_mock, pypi_mock, tmp_path):
+    from aura import exceptions
+    from aura.package import PypiPackage
+
+    def _from_pypi(name):
+        if name == "does-not-exist":
+            raise exceptions.NoSuchPackage(name)
+        return PypiPackage(name, info={"urls": [{"url": f"https://example.com/{name}.tar.gz"}]})
+
+    list_mock.return_value = ["pkg1", "does-not-exist", "pkg2"]
+    pypi_mock.side_effect = _from_pypi
+
+    out_file = tmp_path / "r2c_input.json"
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, ['r2c', 'generate_input', str(out_file)])
+    if result.exception:
+        raise result.exception
+
+    data = json.loads(out_file.read_text())
+    assert data["name"] == "aura"
+    assert [x["metadata"]["package"] for x in data["inputs"]] == ["pkg1", "pkg2"]
+    targets = json.loads(data["inputs"][0]["targets"])
+    assert targets[0]["url"] == "https://example.com/pkg1.tar.gz"
+
+
+@patch("aura.package.PypiPackage.from_pypi")
+@patch("aura.package.PypiPackage.list_packages")
+def test_r2c_generate_input_bounded(list_mock, pypi_mock, tmp_path):
+    from aura.package import PypiPackage
+
+    fetched = []
+    max_ahead = 0
+
+    def _list_packages():
+        nonlocal max_ahead
+        for idx in range(1000):
+            max_ahead = max(max_ahead, idx - len(fetched))
+            yield f"pkg{idx}"
+
+    def _from_pypi(name):
+        time.sleep(0.001)  # Simulated network latency
+        pkg = PypiPackage(name, info={"urls": []})
+        fetched.append(name)
+        return pkg
+
+    list_mock.side_effect = _list_packages
+    pypi_mock.side_effect = _from_pypi
+
+    out_file = tmp_path / "r2c_input.json"
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, ['r2c', 'generate_input', str(out_file)])
+    if result.exception:
+        raise result.exception
+
+    data = json.loads(out_file.read_text())
+    assert [x["metadata"]["package"] for x in data["inputs"]] == [f"pkg{idx}" for idx in range(1000)]
+    # Packages are not submitted far ahead of the already fetched ones
+    assert max_ahead <= 64 * 2 + 1, max_ahead
+
+
+def test_r2c_scan_results(fixtures, tmp_path):
+    out_file = tmp_path / "r2c_output.json"
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, ['r2c', 'scan', '--out', str(out_file), fixtures.path("misc.py")])
+
+    if result.exception:
+        raise result.exception
+
+    data = json.loads(out_file.read_text())
+    assert data["errors"] == []
+    assert len(data["results"]) > 0
+
+    for hit in data["results"]:
+        assert hit["check_id"]
+        if "start" in hit:
+            assert hit["path"] == os.path.relpath(hit["extra"]["location"], fixtures.path("misc.py"))
+
+
+def test_r2c_scan_multiple_sources(fixtures, tmp_path):
+    out_file = tmp_path / "r2c_output.json"
+    sources = [fixtures.path("misc.py"), fixtures.path("obfuscated.py")]
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, ['r2c', 'scan', '--out', str(out_file), *sources])
+
+    if result.exception:
+        raise result.exception
+
+    data = json.loads(out_file.read_text())
+    assert data["errors"] == []
+    locations = {hit["extra"].get("location") for hit in data["results"]}
+    for src in sources:
+        assert src in locations, locations
+
+
+def _crashing_r2c_scan_source(src, metadata, base):
+    if src.endswith("obfuscated.py"):
+        os._exit(1)
+    return {"results": [{"check_id": "Test", "path": src}], "errors": []}
+
+
+def test_r2c_scan_broken_worker(fixtures, tmp_path):
+    from aura import commands
+
+    out_file = tmp_path / "r2c_output.json"
+    sources = [fixtures.path("misc.py"), fixtures.path("obfuscated.py")]
+    runner = CliRunner()
+
+    with patch.object(commands, "_r2c_scan_source", _crashing_r2c_scan_source):
+        result = runner.invoke(cli.cli, ['r2c', 'scan', '--out', str(out_file), *sources])
+
+    if result.exception:
+        raise result.exception
+
+    # Crashed worker is reported per source instead of failing the whole scan
+    data = json.loads(out_file.read_text())
+    failed = {x["data"]["path"] for x in data["errors"]}
+    assert sources[1] in failed
+    assert {x["path"] for x in data["results"]} | failed == set(sources)
+
+
+def test_r2c_scan_source_paths(fixtures):
+    from aura import commands
+
+    base = os.path.dirname(fixtures.path("misc.py"))
+    for variant in (base + "/", base + "/../" + os.path.basename(base)):
+        out = commands._r2c_scan_source(fixtures.path("misc.py"), metadata={"format": ()}, base=variant)
+        paths = {x["path"] for x in out["results"] if "path" in x}
+        assert paths == {"misc.py"}, (variant, paths)
+
+
 def test_async_cleanup(fixtures):
     from aura.uri_handlers import base
 
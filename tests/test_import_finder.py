@@ -31,3 +31,45 @@ def test_get_imports2(test_input, expected, fixtures):
         converted.add(data)
 
     assert expected == converted, converted
+
+
+@pytest.mark.parametrize("test_input", (
+    "import_tester/mypackage/sub1/module1.py",
+    "import_tester/mypackage/root.py",
+    "import_tester/mypackage/py3.py",
+    "misc.py",
+))
+def test_native_imports_match_bytecode(test_input, fixtures):
+    from aura.analyzers import find_imports_inject
+
+    pth = fixtures.path(test_input)
+    with open(pth, "r") as fd:
+        co = compile(fd.read() + "\n", pth, "exec")
+
+    expected = list(find_imports_inject.find_imports(co))
+    assert find_imports.native_find_imports([pth]) == expected
+
+
+def test_scan_location_lazy_imports(fixtures):
+    from pathlib import Path
+    from aura.uri_handlers.base import ScanLocation
+
+    pth = Path(fixtures.path("import_tester/mypackage/sub1/module1.py"))
+    loc = ScanLocation(pth, metadata={"depth": 0})
+    assert "py_imports" not in loc.metadata
+
+    imports = loc.get_imports()
+    assert imports is loc.metadata["py_imports"]
+    assert pth.parent.parent / "sub2" / "module2.py" in imports["dependencies"]
+
+
+def test_native_imports_deeply_nested_expression(tmp_path):
+    pth = tmp_path / "nested.py"
+    pth.write_text(
+        "from . import first\n"
+        "x = " + "+".join(["chr(65)"] * 1600) + "\n"
+        "try:\n    pass\nexcept ImportError:\n    from .. import second\n"
+        "def func():\n    import third\n"
+    )
+
+    assert find_imports.native_find_imports([str(pth)]) == [[1, ["first"], ""], [2, ["second"], ""]]
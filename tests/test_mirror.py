@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from urllib.parse import urlparse
@@ -61,3 +63,16 @@ def test_mirror_metadata(simulate_mirror):
         urls.remove(url)
 
     assert len(urls) == 0
+
+
+def test_scan_mirror(simulate_mirror, tmp_path):
+    from aura import commands
+
+    commands.scan_mirror(output_dir=tmp_path)
+
+    out_pth = tmp_path / "wheel.scan_results.json"
+    assert out_pth.is_file()
+    with out_pth.open("r") as fd:
+        data = json.loads(fd.read())
+
+    assert data["name"] == "mirror://wheel"
@@ -1,4 +1,15 @@
 import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import multiprocessing
+from pathlib import Path
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+import tlsh
 
 
 def test_misc_signatures(fixtures):
@@ -127,6 +138,7 @@ aura:
     <<: *aura_config  # test comment
     test_key: test_val
     async: nope
+    max-depth: 2
 """
     cfg_pth.write_text(cfg_content)
     try:
@@ -141,11 +153,15 @@ aura:
         assert config.CFG["aura"]["text-output-width"] == "auto"
         # Overwritten key
         assert config.CFG["aura"]["async"] == "nope"
+        # Cached value is invalidated by the config reload
+        assert config.get_max_depth() == 2
     finally:
         del os.environ["AURA_CFG"]
         config.CFG_PATH = config.find_configuration()
         config.load_config()
 
+    assert config.get_max_depth() == 5
+
 
 def test_custom_signatures(tmp_path):
     sig_pth = tmp_path / "custom_sig.yml"
@@ -172,3 +188,256 @@ patterns:
     finally:
         del os.environ["AURA_SIGNATURES"]
         config.load_config()
+
+
+def test_json_proxy_dumps():
+    from aura.json_proxy import dumps
+    from aura.analyzers.detections import Detection
+
+    detection = Detection(signature="sig", message="msg", score=5, tags={"tag"})
+    data = {
+        "detection": detection,
+        "path": Path("/tmp/aura_test"),
+        "tags": {"a"},
+        1: "non-string key",
+        "big": 2 ** 70,
+    }
+
+    decoded = json.loads(dumps(data))
+    assert decoded["detection"] == detection._asdict()
+    assert decoded["path"] == "/tmp/aura_test"
+    assert decoded["tags"] == ["a"]
+    assert decoded["1"] == "non-string key"
+    assert decoded["big"] == 2 ** 70
+
+
+def test_scan_location_hash_cache(tmp_path):
+    from aura.uri_handlers.base import ScanLocation
+
+    pth = tmp_path / "hashed.txt"
+    pth.write_text("first content")
+
+    with mock.patch.object(ScanLocation, "_ScanLocation__hash_content", autospec=True, side_effect=ScanLocation._ScanLocation__hash_content) as m:
+        loc1 = ScanLocation(pth, metadata={"depth": 0})
+        loc1.wait_for_hashes()
+        loc2 = ScanLocation(pth, metadata={"depth": 0})
+        loc2.wait_for_hashes()
+        assert m.call_count == 1
+        assert loc1.metadata["sha256"] == loc2.metadata["sha256"] == hashlib.sha256(b"first content").hexdigest()
+
+        pth.write_text("second content, different size")
+        loc3 = ScanLocation(pth, metadata={"depth": 0})
+        assert loc3.get_digest("sha256") == hashlib.sha256(b"second content, different size").hexdigest()
+        assert m.call_count == 2
+
+    # Digests outside of the configured hash set are computed only on demand
+    assert "sha3_256" not in loc3.metadata
+    assert loc3.get_digest("sha3_256") == hashlib.sha3_256(b"second content, different size").hexdigest()
+    assert loc3.get_digest("tlsh") is None  # Content is too short for TLSH
+
+
+def test_scan_location_tlsh_short_content(tmp_path):
+    from aura.uri_handlers.base import ScanLocation
+
+    content = bytes(range(0, 200, 2))
+    pth = tmp_path / "short.bin"
+    pth.write_bytes(content)
+
+    # Content shorter than 256 bytes still gets a digest if the installed TLSH release supports it
+    try:
+        expected = tlsh.hash(content)
+    except ValueError:
+        expected = None
+
+    loc = ScanLocation(pth, metadata={"depth": 0})
+    assert loc.get_digest("tlsh") == (expected or None)
+
+
+def test_scan_location_hash_mmap(tmp_path):
+    import mmap
+    from aura.uri_handlers import base
+
+    # Above the mmap threshold and not aligned to the mmap block size
+    content = os.urandom(base.MMAP_HASH_THRESHOLD + base.MMAP_BLOCK_SIZE // 2 + 3)
+    pth = tmp_path / "large.bin"
+    pth.write_bytes(content)
+
+    with mock.patch.object(mmap, "mmap", wraps=mmap.mmap) as m:
+        loc = base.ScanLocation(pth, metadata={"depth": 0})
+        digests = loc.get_digests(("md5", "sha256", "tlsh"))
+        assert m.call_count == 2
+
+    assert digests["md5"] == hashlib.md5(content).hexdigest()
+    assert digests["sha256"] == hashlib.sha256(content).hexdigest()
+    assert digests["tlsh"] == tlsh.hash(content)
+
+
+def test_scan_location_get_digests(tmp_path):
+    from aura.uri_handlers.base import ScanLocation
+    from aura.analyzers.stats import analyze as file_stats
+
+    content = b"short content"
+    pth = tmp_path / "batch.txt"
+    pth.write_bytes(content)
+
+    with mock.patch.object(ScanLocation, "_ScanLocation__hash_content", autospec=True, side_effect=ScanLocation._ScanLocation__hash_content) as m:
+        loc = ScanLocation(pth, metadata={"depth": 0})
+        # File stats report the configured digests without reading the file again
+        stats = next(file_stats(location=loc))
+        assert stats.extra["sha256"] == hashlib.sha256(content).hexdigest()
+        assert m.call_count == 1
+
+        digests = loc.get_digests(("tlsh", "md5", "sha1", "sha256", "sha512"))
+        # Configured digests are computed in the background, all the missing ones in a single additional pass
+        assert m.call_count == 2
+        assert digests["md5"] == hashlib.md5(content).hexdigest()
+        assert digests["sha512"] == hashlib.sha512(content).hexdigest()
+
+        # Digest that can't be computed is remembered and not retried
+        assert digests["tlsh"] is None
+        assert loc.metadata["tlsh"] is None
+        assert loc.get_digest("tlsh") is None
+        assert loc.get_digests(("md5", "sha1")) == {"md5": digests["md5"], "sha1": digests["sha1"]}
+        assert m.call_count == 2
+
+    # Digests computed on demand are not inherited by children
+    child = loc.create_child(tmp_path / "other.txt")
+    assert "md5" not in child.metadata
+
+
+def test_file_hashes_config():
+    from aura import config
+
+    for cfg_value, expected in (
+        (["md5", "tlsh"], ("md5", "tlsh")),
+        ("sha256", config.DEFAULT_FILE_HASHES),
+        (["sha256", "unknown_hash"], config.DEFAULT_FILE_HASHES),
+        (["shake_128"], config.DEFAULT_FILE_HASHES),
+        ([{"name": "md5"}], config.DEFAULT_FILE_HASHES),
+    ):
+        with mock.patch.dict(config.CFG["aura"], {"hashes": cfg_value}), mock.patch.object(config, "FILE_HASHES_CACHE", None):
+            assert config.get_file_hashes() == expected, cfg_value
+
+
+def test_scan_location_strip(tmp_path):
+    from aura.uri_handlers.base import ScanLocation
+
+    loc = ScanLocation(tmp_path, metadata={"depth": 0}, strip_path=str(tmp_path))
+    assert loc.strip(tmp_path / "setup.py") == "setup.py"
+
+    # Strip path can be re-assigned after the location was created
+    loc.strip_path = str(tmp_path.parent) + "/"
+    assert loc.strip(tmp_path / "setup.py") == f"{tmp_path.name}/setup.py"
+
+    child = ScanLocation(tmp_path / "extracted", metadata={"depth": 1}, strip_path=str(tmp_path), parent="archive.zip")
+    assert child.strip(tmp_path / "extracted" / "setup.py") == "archive.zip$extracted/setup.py"
+    assert child.strip("archive.zip$extracted/setup.py") == "archive.zip$extracted/setup.py"
+
+
+def test_scan_location_hash_cache_reused_inode(tmp_path):
+    from aura.uri_handlers.base import ScanLocation
+
+    # Deleted temp files free their inodes, new files with restored mtime must not get the stale digests
+    for idx in range(20):
+        tmp_dir = tempfile.mkdtemp(dir=tmp_path)
+        pth = os.path.join(tmp_dir, "member.py")
+        content = f"content {idx:04}".encode()
+        with open(pth, "wb") as fd:
+            fd.write(content)
+        os.utime(pth, ns=(1_000_000_000, 1_000_000_000))
+
+        loc = ScanLocation(pth, metadata={"depth": 0})
+        assert loc.get_digest("sha256") == hashlib.sha256(content).hexdigest()
+        shutil.rmtree(tmp_dir)
+
+
+def test_bounded_map():
+    from aura import commands
+
+    consumed = []
+
+    def _items():
+        for idx in range(100):
+            consumed.append(idx)
+            yield idx
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = commands.bounded_map(executor, lambda x: x * 2, _items(), max_pending=4)
+        assert next(results) == 0
+        # Only the jobs within the limit are submitted ahead of the consumed results
+        assert len(consumed) == 5
+        assert list(results) == [x * 2 for x in range(1, 100)]
+
+    executed = []
+
+    def _slow(x):
+        executed.append(x)
+        time.sleep(0.1)
+
+    # Closing the generator cancels the queued jobs, only the one already running is finished
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = commands.bounded_map(executor, _slow, range(10), max_pending=5)
+        next(results)
+        results.close()
+
+    assert executed == [0, 1]
+
+
+def test_scan_parallel_locations_opt_in(fixtures):
+    from aura import commands, config
+
+    metadata = {"format": (), "analyzers": ["ast"]}
+
+    with mock.patch.object(commands, "ThreadPoolExecutor", wraps=commands.ThreadPoolExecutor) as pool:
+        # Locations are scanned sequentially by default
+        commands.scan_uri(fixtures.path("misc.py"), metadata=dict(metadata))
+        pool.assert_not_called()
+
+        with mock.patch.dict(config.CFG["aura"], {"parallel-locations": True}):
+            commands.scan_uri(fixtures.path("misc.py"), metadata=dict(metadata))
+            pool.assert_called_once_with(max_workers=os.cpu_count() or 1)
+
+            # Each location already uses its own process pool in the fork mode
+            pool.reset_mock()
+            commands.scan_uri(fixtures.path("misc.py"), metadata=dict(metadata, fork=True))
+            pool.assert_not_called()
+
+
+def test_scan_location_hashing_after_fork(tmp_path):
+    from aura.uri_handlers import base
+
+    pth = tmp_path / "forked.txt"
+    pth.write_text("forked content")
+
+    def _hash_in_child():
+        loc = base.ScanLocation(pth, metadata={"depth": 0})
+        if loc.get_digest("sha256") != hashlib.sha256(b"forked content").hexdigest():
+            os._exit(1)
+
+    ctx = multiprocessing.get_context("fork")
+    # Simulate a hashing thread holding the cache lock at the time of the fork
+    with base.HASH_CACHE_LOCK:
+        proc = ctx.Process(target=_hash_in_child)
+        proc.start()
+
+    proc.join(timeout=10)
+    if proc.is_alive():
+        proc.kill()
+    assert proc.exitcode == 0
+
+
+def test_scan_location_hashing_error(tmp_path):
+    from aura.uri_handlers.base import ScanLocation
+
+    pth = tmp_path / "unreadable.txt"
+    pth.write_text("content that fails to hash")
+
+    with mock.patch.object(ScanLocation, "_ScanLocation__hash_content", autospec=True, side_effect=PermissionError("denied")) as m:
+        loc = ScanLocation(pth, metadata={"depth": 0})
+        # Failure is recorded as missing digests instead of being raised only by the first caller
+        loc.wait_for_hashes()
+        assert loc.metadata["sha256"] is None
+        assert loc.metadata["tlsh"] is None
+        assert loc.get_digest("sha256") is None
+        assert loc.__getstate__()["metadata"]["sha256"] is None
+        assert m.call_count == 1
@@ -166,6 +166,25 @@ def test_output_not_created_when_below_minimum_score(output_type, fixtures, tmp_
         assert keyword not in cli.stdout, (keyword, cli.stdout)
 
 
+def test_scan_output_feed(tmp_path: Path):
+    from aura.output.base import ScanOutputBase
+    from aura.analyzers.detections import Detection
+
+    out_file = tmp_path / "output.json"
+    formatter = ScanOutputBase.from_uri(f"json://{out_file}")
+
+    formatter.feed(Detection(signature="info", message="informational", informational=True))
+    formatter.feed(Detection(signature="hit", message="scored detection", score=10))
+    assert len(formatter._feed_buffer) == 1
+
+    formatter.flush(scan_metadata={"name": "test"})
+    assert formatter._feed_buffer == []
+
+    data = json.loads(out_file.read_text())
+    assert data["score"] == 10
+    assert [x["signature"] for x in data["detections"]] == ["hit"]
+
+
 @pytest.mark.parametrize(
     "scan_file",
     (
@@ -366,3 +385,15 @@ def test_sarif_output(infile, fixtures):
 
     output = fixtures.scan_test_file(infile, args=["-f", "sarif"])
     jsonschema.validate(output, schema)
+
+
+def test_sarif_output_archive_digests(fixtures):
+    # Archive members are removed before the output is written, digests must be computed while they exist
+    output = fixtures.scan_test_file("djamgo-0.0.1-py3-none-any.whl", args=["-f", "sarif"])
+    artifacts = [a for run in output["runs"] for a in run.get("artifacts", [])]
+    assert artifacts
+
+    # Only the digests from the `aura.hashes` config are reported, these are computed for every scanned file
+    for artifact in artifacts:
+        assert "sha-256" in artifact["hashes"], artifact
+        assert "md5" not in artifact["hashes"], artifact
@@ -118,3 +118,19 @@ def test_package_diff_candidates(mock_pypi_rest_api):
     candidates = tuple(map(convert, requests.get_diff_candidates(requests2)))
     assert ('requests-2.16.0.tar.gz', 'requests2-2.16.0.tar.gz') in candidates
     assert ('requests-2.24.0.tar.gz', 'requests2-2.16.0.tar.gz') in candidates
+
+
+@responses.activate
+def test_pypi_scan_drops_downloaded_locations(mock_pypi_rest_api, tmp_path):
+    from aura import commands
+    from aura.uri_handlers.pypi import PyPiHandler
+
+    mock_pypi_rest_api(responses)
+
+    with patch.object(PyPiHandler, "drop_location", autospec=True, side_effect=PyPiHandler.drop_location) as m:
+        commands.scan_uri("pypi://wheel", metadata={"format": (), "analyzers": ["ast"], "parallel": False})
+
+    dropped = [c.args[1].location for c in m.call_args_list]
+    assert "wheel-0.34.2.tar.gz" in [x.name for x in dropped]
+    # Every scanned download is passed to drop_location and is gone once the scan finishes
+    assert not any(x.exists() for x in dropped)
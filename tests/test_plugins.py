@@ -1,3 +1,5 @@
+import pytest
+
 from aura.analyzers.detections import Detection
 from aura import plugins
 
@@ -20,3 +22,53 @@ def test_get_analyzers_custom(fixtures):
                 responses.add(r.detection_type)
 
         assert len(expected_responses-responses) == 0, responses
+
+
+def test_uri_handlers_cache():
+    from aura.uri_handlers.base import URIHandler
+
+    handlers = URIHandler.load_handlers()
+    assert URIHandler.load_handlers() is handlers
+    assert "file" in handlers
+
+    with_disabled = URIHandler.load_handlers(ignore_disabled=False)
+    assert isinstance(with_disabled["disabled"], dict)
+    with_disabled.pop("disabled")
+    assert "disabled" not in URIHandler.load_handlers()
+
+
+@pytest.mark.parametrize("uri,handler_name", (
+    ("/tmp", "LocalFileHandler"),
+    ("file:///tmp", "LocalFileHandler"),
+    ("https://github.com/SourceCode-AI/aura.git", "GitRepoHandler"),
+    ("git://github.com/SourceCode-AI/aura", "LocalFileHandler"),
+))
+def test_uri_handler_resolution(uri, handler_name):
+    from aura.uri_handlers.base import URIHandler
+
+    handler = URIHandler.from_uri(uri)
+    assert type(handler).__name__ == handler_name
+
+
+@pytest.mark.parametrize("uri,handler_name", (
+    ("pypi://requests/requests.git", "PyPiHandler"),
+    ("mirror://requests/requests.git", "MirrorHandler"),
+    ("git://github.com/SourceCode-AI/aura.git", "GitRepoHandler"),
+    ("/tmp/aura.git", "GitRepoHandler"),
+))
+def test_uri_handler_lookup_order(uri, handler_name):
+    """
+    Handler registered for the URI scheme takes precedence over the handlers with a custom `is_supported` check
+    """
+    from aura.uri_handlers.base import URIHandler, _parse_uri
+
+    URIHandler.load_handlers()
+    assert URIHandler.lookup_handler(_parse_uri(uri)).__name__ == handler_name
+
+
+def test_diff_uri_handler_resolution():
+    from aura.uri_handlers.base import URIHandler
+
+    handler1, handler2 = URIHandler.diff_from_uri("/tmp", "https://github.com/SourceCode-AI/aura.git")
+    assert type(handler1).__name__ == "LocalFileHandler"
+    assert type(handler2).__name__ == "GitRepoHandler"
@@ -1,5 +1,8 @@
 import os
 import json
+import random
+import itertools
+from functools import partial
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
@@ -20,6 +23,95 @@ def test_distance():
     assert dm == 1
 
 
+@pytest.mark.parametrize("pair", (
+    ("requests", "requestes"),
+    ("requests", "reqeusts"),
+    ("flask", "flsak"),
+    ("django", "djamgo"),
+    ("pip", "pip2"),
+    ("", "abc"),
+    ("botocore", "urllib3"),
+))
+@pytest.mark.parametrize("max_distance", (1, 2, 3))
+def test_distance_fallback(pair, max_distance):
+    """
+    Verify that the JIT compiled distance (if available) matches the pure python implementation
+    """
+    expected = typos._damerau_levenshtein(*pair, max_distance=max_distance)
+    assert typos.damerau_levenshtein(*pair, max_distance=max_distance) == expected
+
+
+@pytest.mark.skipif(typos._dl_core is None, reason="numba is not installed")
+def test_distance_jit_fuzz():
+    """
+    Verify the JIT compiled distance against the pure python implementation on randomly generated names
+    """
+    rng = random.Random(1337)
+    alphabet = "abcdefgh-_.0123456789"
+
+    for _ in range(5000):
+        s1 = "".join(rng.choices(alphabet, k=rng.randint(0, 12)))
+        # Mutations of the first name are generated as well so all of the distances up to the max are covered
+        if rng.random() < 0.5:
+            s2 = list(s1)
+            for _ in range(rng.randint(0, 4)):
+                pos = rng.randint(0, len(s2))
+                op = rng.randint(0, 2)
+                if op == 0:
+                    s2.insert(pos, rng.choice(alphabet))
+                elif s2 and op == 1:
+                    del s2[min(pos, len(s2) - 1)]
+                elif len(s2) > 1:
+                    pos = min(pos, len(s2) - 2)
+                    s2[pos], s2[pos + 1] = s2[pos + 1], s2[pos]
+            s2 = "".join(s2)
+        else:
+            s2 = "".join(rng.choices(alphabet, k=rng.randint(0, 12)))
+
+        max_distance = rng.randint(1, 4)
+        cap = rng.choice((None, True, 99))
+        expected = typos._damerau_levenshtein(s1, s2, max_distance=max_distance, cap=cap)
+        assert typos.damerau_levenshtein(s1, s2, max_distance=max_distance, cap=cap) == expected, (s1, s2, max_distance, cap)
+
+
+@pytest.mark.parametrize("max_distance", (1, 2, 3))
+def test_candidate_pairs_prefilter(max_distance):
+    popular = {"requests", "flask", "django", "pip", "urllib3", "google-api-core"}
+    full_list = {
+        "requestes", "reqeusts", "request", "grequest", "flsak", "flask2", "djamgo",
+        "pip2", "urllib", "googleapicore", "numpy", "botocore", "a", "xyz-requests-xyz"
+    }
+
+    candidates = set(typos.candidate_pairs(popular, full_list, max_distance))
+    assert len(candidates) < len(popular) * len(full_list)
+
+    for pair in itertools.product(popular, full_list):
+        distance = typos.damerau_levenshtein(*pair, max_distance=max_distance)
+        if distance is not None and distance <= max_distance:
+            assert pair in candidates, pair
+
+
+def test_nearest_topk():
+    popular = {"requests", "flask"}
+    full_list = {"requestes", "reqeusts", "request", "requests2", "flsak", "flask2", "numpy", "aequestz", "flazk22"}
+    f = partial(typos.damerau_levenshtein, max_distance=2)
+
+    nearest = list(typos.nearest(typos.candidate_pairs(popular, full_list, max_distance=2), f, topk=2))
+    for pkg in popular:
+        assert len([x for x in nearest if x[0] == pkg]) == 2
+
+    # Matches at distance 2 are ranked after all the closer ones despite being first alphabetically
+    assert ("requests", "aequestz") not in nearest
+    assert ("flask", "flazk22") not in nearest
+
+    nearest = list(typos.nearest(typos.candidate_pairs({"requests"}, {"aequestz"}, max_distance=2), f, topk=2))
+    assert nearest == [("requests", "aequestz")]
+
+    # Equal distances are ranked by the similarity ratio
+    nearest = list(typos.nearest(typos.candidate_pairs({"requests"}, {"aequests", "requestss"}, max_distance=1), f, topk=1))
+    assert nearest == [("requests", "requestss")]
+
+
 @patch("aura.typos.get_all_pypi_packages")
 def test_typosquatting_generator(mock, tmp_path, mock_pypi_stats):
     stats: Path = tmp_path / "pypi_stats.json"
@@ -99,6 +191,27 @@ def test_check_name_invalid(typo, mock_pypi_stats):
 
 
 
+@patch("aura.typos.get_all_pypi_packages")
+def test_typosquatting_generator_topk(mock, tmp_path, mock_pypi_stats):
+    stats: Path = tmp_path / "pypi_stats.json"
+    stats.write_text("\n".join(json.dumps(x) for x in config.iter_pypi_stats()))
+    os.environ["AURA_PYPI_STATS"] = str(stats)
+    try:
+        mock.return_value = ["requests", "requestes", "requests2", "requests3", "request", "grequest"]
+
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, ['find-typosquatting', '-k', '2'])
+        if result.exception:
+            raise result.exception
+
+        entries = [json.loads(line) for line in result.output.split('\n') if line.strip()]
+        assert entries
+        for original in {x["original"] for x in entries}:
+            assert len([x for x in entries if x["original"] == original]) <= 2
+    finally:
+        del os.environ["AURA_PYPI_STATS"]
+
+
 @patch("xmlrpc.client.ServerProxy")
 def test_mocked_get_all_pypi_packages(mock):
     srv_mock = mock.return_value